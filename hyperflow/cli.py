@@ -3,12 +3,11 @@
 HyperFlow CLI - Command line interface for managing HyperFlow daemon
 """
 
-import argparse
+import fcntl
 import subprocess
 import sys
 import os
 import signal
-import psutil
 import time
 from pathlib import Path
 
@@ -18,30 +17,40 @@ def get_pid_file():
     return Path.home() / ".config/hyperflow/hyperflow.pid"
 
 
+def pid_alive(pid):
+    """Check whether a process with the given PID exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
 def find_daemon_process():
     """Find running HyperFlow daemon process"""
-    # First try to read from PID file
+    # The daemon holds a lock on its PID file for as long as it runs
     pid_file = get_pid_file()
-    if pid_file.exists():
-        try:
-            with open(pid_file, 'r') as f:
-                pid = int(f.read().strip())
-            # Verify the process is actually running and is a HyperFlow daemon
-            proc = psutil.Process(pid)
-            if 'hyperflow' in ' '.join(proc.cmdline()) and 'daemon.py' in ' '.join(proc.cmdline()):
-                return pid
-        except (ValueError, psutil.NoSuchProcess, psutil.AccessDenied, FileNotFoundError):
-            # PID file is invalid or process is not running
-            if pid_file.exists():
-                pid_file.unlink()
-    
-    # Fallback: search for the process
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+    try:
+        fd = os.open(pid_file, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
         try:
-            if 'hyperflow' in proc.info['cmdline'] and 'daemon.py' in proc.info['cmdline']:
-                return proc.info['pid']
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
+            return int(os.read(fd, 32).strip())
+        except ValueError:
+            return None
+        finally:
+            os.close(fd)
+    # Nobody holds the lock, so the PID file is stale
+    try:
+        pid_file.unlink()
+    except FileNotFoundError:
+        pass
+    os.close(fd)
     return None
 
 
@@ -60,37 +69,38 @@ def start_daemon():
     
     # Start daemon
     try:
+        # Nothing reads the daemon's output, so discard it instead of piping
+        # it, and detach the daemon from the CLI's session
         process = subprocess.Popen([
             sys.executable, str(daemon_script)
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Write PID to file
-        pid_file = get_pid_file()
-        pid_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(pid_file, 'w') as f:
-            f.write(str(process.pid))
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True, close_fds=True)
         
+        # The daemon writes and locks its own PID file
         print(f"Started HyperFlow daemon (PID: {process.pid})")
     except Exception as e:
         print(f"Error starting daemon: {e}")
 
 
 def stop_daemon():
-    """Stop the HyperFlow daemon"""
+    """Stop the HyperFlow daemon and return the PID it was running as"""
     pid = find_daemon_process()
     if not pid:
         print("HyperFlow daemon is not running")
-        return
+        return None
     
     try:
         os.kill(pid, signal.SIGTERM)
         print(f"Sent SIGTERM to HyperFlow daemon (PID: {pid})")
         
-        # Wait a bit for graceful shutdown
-        time.sleep(1)
+        # Wait up to a second for graceful shutdown
+        for _ in range(20):
+            if not pid_alive(pid):
+                break
+            time.sleep(0.05)
         
         # Check if still running
-        if psutil.pid_exists(pid):
+        if pid_alive(pid):
             os.kill(pid, signal.SIGKILL)
             print(f"Sent SIGKILL to HyperFlow daemon (PID: {pid})")
         
@@ -98,6 +108,7 @@ def stop_daemon():
         pid_file = get_pid_file()
         if pid_file.exists():
             pid_file.unlink()
+        return pid
     except ProcessLookupError:
         print("HyperFlow daemon is not running")
         # Remove stale PID file
@@ -106,12 +117,20 @@ def stop_daemon():
             pid_file.unlink()
     except Exception as e:
         print(f"Error stopping daemon: {e}")
+    return None
 
 
 def restart_daemon():
     """Restart the HyperFlow daemon"""
-    stop_daemon()
-    time.sleep(1)
+    old_pid = stop_daemon()
+    
+    # Wait up to a second for the old daemon to go away
+    pid_file = get_pid_file()
+    for _ in range(50):
+        if not pid_file.exists() and (old_pid is None or not pid_alive(old_pid)):
+            break
+        time.sleep(0.02)
+    
     start_daemon()
 
 
@@ -140,7 +159,23 @@ def reload_daemon():
         print(f"Error reloading daemon: {e}")
 
 
+# Subcommand name to handler
+_CMDS = {
+    'start': start_daemon,
+    'stop': stop_daemon,
+    'restart': restart_daemon,
+    'status': status_daemon,
+    'reload': reload_daemon
+}
+
+
 def main():
+    # Plain `status` is the most common call; answer it without argparse
+    if sys.argv[1:] == ['status']:
+        status_daemon()
+        return
+    
+    import argparse
     parser = argparse.ArgumentParser(description="HyperFlow CLI - Manage Hyprland automation")
     subparsers = parser.add_subparsers(dest='command', help='Commands')
     
@@ -161,18 +196,7 @@ def main():
     
     args = parser.parse_args()
     
-    if args.command == 'start':
-        start_daemon()
-    elif args.command == 'stop':
-        stop_daemon()
-    elif args.command == 'restart':
-        restart_daemon()
-    elif args.command == 'status':
-        status_daemon()
-    elif args.command == 'reload':
-        reload_daemon()
-    else:
-        parser.print_help()
+    (_CMDS.get(args.command) or parser.print_help)()
 
 
 if __name__ == "__main__":
@@ -5,13 +5,209 @@ Listens to Hyprland events and executes actions based on configured workflows
 """
 
 import asyncio
+import fcntl
 import os
-import subprocess
 import json
+import logging
+import operator
+import shlex
 import signal
 import sys
+import time
+from dataclasses import dataclass
 from pathlib import Path
 
+log = logging.getLogger('hyperflow')
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+def setup_logging(verbose=False):
+    """Configure daemon logging; per-event messages are only shown when verbose"""
+    logging.basicConfig(format='%(message)s')
+    log.setLevel(logging.DEBUG if verbose else logging.WARNING)
+
+
+# Map property names to event data indices based on event type
+# Different event types have different data structures
+_PROPERTY_MAP = {
+    # openwindow/closewindow: address, workspace, class, title
+    'openwindow': {
+        'address': 0,
+        'workspace': 1,
+        'class': 2,
+        'title': 3
+    },
+    'closewindow': {
+        'address': 0,
+        'workspace': 1,
+        'class': 2,
+        'title': 3
+    },
+    # activewindow: class, title
+    'activewindow': {
+        'class': 0,
+        'title': 1
+    },
+    # activewindowv2: address
+    'activewindowv2': {
+        'address': 0
+    },
+    # workspace: name
+    'workspace': {
+        'name': 0
+    },
+    # workspacev2: name, id
+    'workspacev2': {
+        'name': 0,
+        'id': 1
+    },
+    # destroyworkspacev2: name, id
+    'destroyworkspacev2': {
+        'name': 0,
+        'id': 1
+    },
+    # windowtitle: address
+    'windowtitle': {
+        'address': 0
+    },
+    # windowtitlev2: address, title
+    'windowtitlev2': {
+        'address': 0,
+        'title': 1
+    },
+    # activelayout: keyboard, layout
+    'activelayout': {
+        'keyboard': 0,
+        'layout': 1
+    }
+}
+_EMPTY = {}
+
+# Monotonic clock used for debounce intervals
+_now = time.monotonic
+
+
+def _never(actual_value, expected_value):
+    return False
+
+
+def _contains(actual_value, expected_value):
+    return expected_value in actual_value
+
+
+def _greater(actual_value, expected_value):
+    try:
+        return float(actual_value) > expected_value
+    except ValueError:
+        return False
+
+
+def _less(actual_value, expected_value):
+    try:
+        return float(actual_value) < expected_value
+    except ValueError:
+        return False
+
+
+# Comparison functions keyed by condition operator
+_OPS = {
+    'equals': operator.eq,
+    'contains': _contains,
+    'startswith': str.startswith,
+    'endswith': str.endswith,
+    'greater': _greater,
+    'less': _less
+}
+_NUMERIC_OPS = ('greater', 'less')
+
+
+def compile_condition(condition, event_property_map):
+    """Resolve a condition to an (index, op_fn, value) tuple.
+
+    Unknown properties compile to index None and unknown operators or
+    non-numeric values for numeric operators compile to a function that
+    never matches.
+    """
+    index = event_property_map.get(condition.get('property'))
+    op_name = condition.get('operator')
+    op_fn = _OPS.get(op_name, _never)
+    expected_value = condition.get('value')
+    if op_name in _NUMERIC_OPS:
+        try:
+            expected_value = float(expected_value)
+        except (TypeError, ValueError):
+            op_fn = _never
+    return index, op_fn, expected_value
+
+
+# Characters that need /bin/sh to interpret a command
+_SHELL_CHARS = frozenset('|&;<>()$`\\*?[]{}~!#\n')
+
+
+# hyprctl subcommands that can be sent straight to the command socket
+_SOCKET_COMMANDS = ('dispatch', 'keyword')
+
+
+def compile_action(action):
+    """Resolve an action to a (command, argv, request) tuple.
+
+    argv is None when the command uses shell syntax and has to be run
+    through /bin/sh; otherwise it can be executed directly. request holds
+    the raw command socket message for plain `hyprctl dispatch`/`keyword`
+    calls, or None.
+    """
+    command = action.get('command')
+    if not command or not _SHELL_CHARS.isdisjoint(command):
+        return command, None, None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return command, None, None
+    if not argv or '=' in argv[0]:
+        return command, None, None
+    request = None
+    if len(argv) > 2 and argv[0] == 'hyprctl' and argv[1] in _SOCKET_COMMANDS:
+        # Same message hyprctl builds: no flags, then the joined arguments
+        request = ('/' + ' '.join(argv[1:])).encode()
+    return command, argv, request
+
+
+@dataclass(slots=True)
+class CompiledRule:
+    """A rule preprocessed for fast matching"""
+    id: str
+    name: str
+    debounce_s: float
+    conditions: tuple
+    actions: tuple
+
+
+def compile_rule(rule):
+    """Build a CompiledRule from a rule loaded from the config file"""
+    trigger = rule.get('trigger', {})
+    event_property_map = _PROPERTY_MAP.get(trigger.get('type'), _EMPTY)
+    return CompiledRule(
+        id=rule.get('id', ''),
+        name=rule.get('name', 'unnamed'),
+        debounce_s=trigger.get('debounce', 0) / 1000.0,
+        conditions=tuple(
+            compile_condition(condition, event_property_map)
+            for condition in rule.get('conditions', [])
+        ),
+        actions=tuple(
+            compile_action(action) for action in rule.get('actions', [])
+        )
+    )
+
+
+# Signals handled on the event loop by the daemon
+_HANDLED_SIGNALS = {signal.SIGHUP, signal.SIGTERM, signal.SIGINT}
+
 
 class HyperFlowDaemon:
     def __init__(self):
@@ -35,39 +231,90 @@ class HyperFlowDaemon:
         self.pid_file = Path.home() / ".config/hyperflow/hyperflow.pid"
         
         # File watching
-        self.last_modified_time = 0
+        self.config_mtime_ns = 0
+        # mtime of a config that failed to load, so it is not retried until it changes
+        self.failed_config_mtime_ns = 0
+        
+        # Event debouncing tracking
+        self.last_event_time = {}
+        self.debounce_intervals = {}
         
         # Load rules
         self.rules = []
+        self.rules_by_type = {}
         self.load_rules()
         
-        # Event debouncing tracking
-        self.last_event_time = {}
-        self.debounce_intervals = {}
+        # Running action subprocess reapers
+        self.background_tasks = set()
+        
+        # Event listener task, cancelled on SIGTERM/SIGINT
+        self.listen_task = None
+        
+        # Locked PID file descriptor, held for the daemon's lifetime
+        self.pid_fd = None
 
     def load_rules(self):
         """Load workflow rules from JSON config file"""
+        mtime_ns = 0
         try:
             if self.config_path.exists():
-                with open(self.config_path, 'r') as f:
-                    self.rules = json.load(f)
-                print(f"Loaded {len(self.rules)} rules from {self.config_path}")
+                # Skip the reload entirely if the file has not changed
+                mtime_ns = self.config_path.stat().st_mtime_ns
+                if mtime_ns == self.config_mtime_ns:
+                    print("Config file unchanged, keeping current rules")
+                    return
                 
-                # Update last modified time
-                self.last_modified_time = self.config_path.stat().st_mtime
+                self.rules = _loads(self.config_path.read_bytes())
+                self.build_rule_index()
+                # Only record the mtime once the rules are actually in use
+                self.config_mtime_ns = mtime_ns
+                self.failed_config_mtime_ns = 0
+                print(f"Loaded {len(self.rules)} rules from {self.config_path}")
             else:
                 print(f"Config file not found: {self.config_path}")
+                self.config_mtime_ns = 0
+                self.failed_config_mtime_ns = 0
                 self.rules = []
+                self.rules_by_type = {}
         except Exception as e:
             print(f"Error loading rules: {e}")
+            self.config_mtime_ns = 0
+            self.failed_config_mtime_ns = mtime_ns
             self.rules = []
+            self.rules_by_type = {}
+
+    def build_rule_index(self):
+        """Compile enabled rules and group them by trigger type.
+
+        Keys are the event type as bytes so events can be matched against
+        the index before they are decoded.
+        """
+        rules_by_type = {}
+        for rule in self.rules:
+            if not rule.get('enabled', True):
+                continue
+            event_type = rule.get('trigger', {}).get('type')
+            if not isinstance(event_type, str):
+                continue
+            rules_by_type.setdefault(event_type.encode(), []).append(compile_rule(rule))
+        self.rules_by_type = rules_by_type
+        
+        # Seed debounce state for every debounced rule so the event path only
+        # updates existing entries, keeping timestamps across reloads
+        last_event_time = self.last_event_time
+        self.last_event_time = {
+            rule.id: last_event_time.get(rule.id, 0.0)
+            for rules in rules_by_type.values()
+            for rule in rules
+            if rule.debounce_s > 0
+        }
 
     def check_config_changes(self):
         """Check if config file has been modified and reload if needed"""
         try:
             if self.config_path.exists():
-                mtime = self.config_path.stat().st_mtime
-                if mtime > self.last_modified_time:
+                mtime_ns = self.config_path.stat().st_mtime_ns
+                if mtime_ns not in (self.config_mtime_ns, self.failed_config_mtime_ns):
                     print("Detected config file changes, reloading rules...")
                     self.load_rules()
                     return True
@@ -76,180 +323,127 @@ class HyperFlowDaemon:
             print(f"Error checking config file changes: {e}")
             return False
 
-    def reload_handler(self, signum, frame):
+    def reload_handler(self):
         """Handle SIGHUP signal to reload rules"""
         print("Reloading rules...")
         self.load_rules()
 
-    def cleanup_handler(self, signum, frame):
-        """Handle termination signals to clean up"""
+    def cleanup_handler(self):
+        """Handle termination signals by stopping the event listener"""
         print("Cleaning up...")
-        # Remove PID file
-        if self.pid_file.exists():
-            self.pid_file.unlink()
-        sys.exit(0)
-
-    def parse_event(self, event_str):
-        """Parse Hyprland event string into structured data"""
-        if '>>' not in event_str:
-            return None, None
-            
-        event_type, event_data = event_str.split('>>', 1)
-        data_parts = event_data.split(',')
-        return event_type, data_parts
-
-    def check_condition(self, condition, event_data, event_type):
-        """Check if a condition matches the event data"""
-        property_name = condition.get('property')
-        operator = condition.get('operator')
-        expected_value = condition.get('value')
-        
-        # Map property names to event data indices based on event type
-        # Different event types have different data structures
-        property_map = {
-            # openwindow/closewindow: address, workspace, class, title
-            'openwindow': {
-                'address': 0,
-                'workspace': 1,
-                'class': 2,
-                'title': 3
-            },
-            'closewindow': {
-                'address': 0,
-                'workspace': 1,
-                'class': 2,
-                'title': 3
-            },
-            # activewindow: class, title
-            'activewindow': {
-                'class': 0,
-                'title': 1
-            },
-            # activewindowv2: address
-            'activewindowv2': {
-                'address': 0
-            },
-            # workspace: name
-            'workspace': {
-                'name': 0
-            },
-            # workspacev2: name, id
-            'workspacev2': {
-                'name': 0,
-                'id': 1
-            },
-            # destroyworkspacev2: name, id
-            'destroyworkspacev2': {
-                'name': 0,
-                'id': 1
-            },
-            # windowtitle: address
-            'windowtitle': {
-                'address': 0
-            },
-            # windowtitlev2: address, title
-            'windowtitlev2': {
-                'address': 0,
-                'title': 1
-            },
-            # activelayout: keyboard, layout
-            'activelayout': {
-                'keyboard': 0,
-                'layout': 1
-            }
-        }
-        
-        # Get property mapping for this event type
-        event_property_map = property_map.get(event_type, {})
-        
-        if property_name not in event_property_map:
-            return False
-            
-        index = event_property_map[property_name]
-        if index >= len(event_data):
-            return False
-            
-        actual_value = event_data[index]
-        
-        # Perform comparison based on operator
-        if operator == 'equals':
-            return actual_value == expected_value
-        elif operator == 'contains':
-            return expected_value in actual_value
-        elif operator == 'startswith':
-            return actual_value.startswith(expected_value)
-        elif operator == 'endswith':
-            return actual_value.endswith(expected_value)
-        elif operator == 'greater':
-            try:
-                return float(actual_value) > float(expected_value)
-            except ValueError:
-                return False
-        elif operator == 'less':
-            try:
-                return float(actual_value) < float(expected_value)
-            except ValueError:
-                return False
-                
-        return False
+        if self.listen_task is not None:
+            self.listen_task.cancel()
 
-    def should_execute_rule(self, rule, event_type, event_data):
-        """Determine if a rule should be executed based on event and conditions"""
-        # Check if rule is enabled
-        if not rule.get('enabled', True):
+    def check_condition(self, condition, event_data):
+        """Check if a compiled (index, op_fn, value) condition matches the event data"""
+        index, op_fn, expected_value = condition
+        if index is None or index >= len(event_data):
             return False
-            
-        # Check trigger type
-        trigger = rule.get('trigger', {})
-        if trigger.get('type') != event_type:
-            return False
-            
+        return op_fn(event_data[index], expected_value)
+
+    def should_execute_rule(self, rule, event_data):
+        """Determine if a compiled rule should be executed based on debounce and conditions"""
         # Check debounce
-        rule_id = rule.get('id', '')
-        debounce_ms = trigger.get('debounce', 0)
-        if debounce_ms > 0:
-            current_time = asyncio.get_event_loop().time()
-            last_time = self.last_event_time.get(rule_id, 0)
-            if current_time - last_time < debounce_ms / 1000:
+        if rule.debounce_s > 0:
+            current_time = _now()
+            last_time = self.last_event_time[rule.id]
+            if current_time - last_time < rule.debounce_s:
                 return False
-            self.last_event_time[rule_id] = current_time
+            self.last_event_time[rule.id] = current_time
         
         # Check conditions
-        conditions = rule.get('conditions', [])
-        for condition in conditions:
-            if not self.check_condition(condition, event_data, event_type):
+        for condition in rule.conditions:
+            if not self.check_condition(condition, event_data):
                 return False
                 
         return True
 
-    def execute_actions(self, rule):
+    async def execute_actions(self, rule):
         """Execute all actions defined in a rule"""
-        actions = rule.get('actions', [])
-        for action in actions:
-            command = action.get('command')
+        for command, argv, request in rule.actions:
             if command:
                 try:
-                    print(f"Executing: {command}")
-                    subprocess.run(command, shell=True)
+                    log.debug("Executing: %s", command)
+                    # Await each action so they start in the order listed
+                    if request is not None:
+                        await self.send_command(command, argv, request)
+                    else:
+                        await self.run_command(command, argv)
                 except Exception as e:
                     print(f"Error executing command '{command}': {e}")
 
-    def process_event(self, event_str):
-        """Process an incoming event and check against all rules"""
-        event_type, event_data = self.parse_event(event_str)
-        if not event_type or not event_data:
+    async def run_command(self, command, argv):
+        """Start a command as a subprocess, through the shell if argv is None"""
+        if argv is None:
+            proc = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+        # Reap the child in the background instead of blocking on it
+        self.spawn_task(proc.wait())
+
+    async def send_command(self, command, argv, request):
+        """Send a request to the Hyprland command socket instead of spawning hyprctl"""
+        try:
+            # Hyprland answers one request per connection and then closes it
+            reader, writer = await asyncio.open_unix_connection(str(self.command_socket_path))
+        except OSError as e:
+            print(f"Failed to connect to Hyprland command socket: {e}")
+            try:
+                await self.run_command(command, argv)
+            except Exception as e:
+                print(f"Error executing command '{command}': {e}")
             return
-            
-        print(f"Processing event: {event_type} with data {event_data}")
+        try:
+            writer.write(request)
+            await writer.drain()
+            reply = await reader.read()
+            if reply.strip() != b'ok':
+                print(f"Command '{command}' failed: {reply.decode(errors='replace').strip()}")
+        except Exception as e:
+            print(f"Error executing command '{command}': {e}")
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    def spawn_task(self, coro):
+        """Schedule a background task and keep a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    async def process_event(self, line):
+        """Process a raw event line and check it against subscribed rules"""
+        # Event format is TYPE>>DATA
+        sep = line.find(b'>>')
+        if sep <= 0:
+            return
+        event_type = line[:sep]
         
         # Check config changes before processing event
         self.check_config_changes()
         
-        # Check all rules
-        for rule in self.rules:
-            if self.should_execute_rule(rule, event_type, event_data):
-                print(f"Rule '{rule.get('name', 'unnamed')}' matched. Executing actions.")
-                self.execute_actions(rule)
+        # Skip events no rule subscribes to before decoding anything
+        rules = self.rules_by_type.get(event_type)
+        if not rules:
+            return
+            
+        event_data = line[sep + 2:].decode(errors='replace').strip().split(',')
+        log.debug("Processing event: %s with data %s", event_type.decode(), event_data)
+        
+        # Check rules subscribed to this event type
+        for rule in rules:
+            if self.should_execute_rule(rule, event_data):
+                log.debug("Rule '%s' matched. Executing actions.", rule.name)
+                await self.execute_actions(rule)
 
     async def listen_to_events(self):
         """Listen to Hyprland event socket and process events"""
@@ -261,31 +455,70 @@ class HyperFlowDaemon:
             return
             
         try:
+            # Read in chunks and split lines ourselves so a burst of events
+            # is handled with a single await
+            buf = bytearray()
             while True:
-                line = await reader.readline()
-                if not line:
+                chunk = await reader.read(65536)
+                if not chunk:
                     break
-                event_str = line.decode().strip()
-                self.process_event(event_str)
+                buf += chunk
+                while (nl := buf.find(b'\n')) != -1:
+                    line = bytes(buf[:nl])
+                    del buf[:nl + 1]
+                    await self.process_event(line)
         except Exception as e:
             print(f"Error reading from socket: {e}")
         finally:
             writer.close()
             await writer.wait_closed()
 
+    def write_pid_file(self):
+        """Lock the PID file and write our PID into it.
+
+        The file is never renamed, so every daemon contends for the same
+        lock. Returns False if another daemon already holds it.
+        """
+        fd = os.open(self.pid_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        
+        # Only the lock holder touches the contents
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self.pid_fd = fd
+        return True
+
+    async def serve(self):
+        """Install signal handlers on the event loop and listen for events"""
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, self.reload_handler)
+        loop.add_signal_handler(signal.SIGTERM, self.cleanup_handler)
+        loop.add_signal_handler(signal.SIGINT, self.cleanup_handler)
+        
+        # Handlers are in place, let any pending signals through
+        self.listen_task = asyncio.create_task(self.listen_to_events())
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, _HANDLED_SIGNALS)
+        try:
+            await self.listen_task
+        except asyncio.CancelledError:
+            pass
+
     def run(self):
         """Run the daemon"""
-        # Setup signal handlers
-        signal.signal(signal.SIGHUP, self.reload_handler)
-        signal.signal(signal.SIGTERM, self.cleanup_handler)
-        signal.signal(signal.SIGINT, self.cleanup_handler)
+        # Hold signals until the event loop has handlers for them
+        signal.pthread_sigmask(signal.SIG_BLOCK, _HANDLED_SIGNALS)
         
         # Create config directory if it doesn't exist
         self.config_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Write PID file
-        with open(self.pid_file, 'w') as f:
-            f.write(str(os.getpid()))
+        # Write PID file, refusing to start next to a running daemon
+        if not self.write_pid_file():
+            print("HyperFlow daemon is already running")
+            sys.exit(1)
         
         # Create default config if it doesn't exist
         if not self.config_path.exists():
@@ -319,7 +552,7 @@ class HyperFlowDaemon:
         
         print("HyperFlow daemon started. Send SIGHUP to reload rules.")
         try:
-            asyncio.run(self.listen_to_events())
+            asyncio.run(self.serve())
         except KeyboardInterrupt:
             print("Received interrupt signal, shutting down...")
         finally:
@@ -329,5 +562,6 @@ class HyperFlowDaemon:
 
 
 if __name__ == "__main__":
+    setup_logging('--verbose' in sys.argv[1:])
     daemon = HyperFlowDaemon()
     daemon.run()
\ No newline at end of file
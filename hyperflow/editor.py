@@ -4,16 +4,43 @@ HyperFlow Editor - GUI for creating and editing automation workflows
 """
 
 import sys
+import hashlib
 import json
 import os
+import re
+import secrets
+from functools import partial
 from pathlib import Path
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QListWidget, QListWidgetItem, QDialog, 
+    QPushButton, QListView, QDialog, 
     QLineEdit, QFormLayout, QComboBox, QLabel, QCheckBox,
     QMessageBox, QFileDialog
 )
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QIntValidator
+from PySide6.QtCore import (
+    Qt, QAbstractListModel, QModelIndex, QStringListModel, QThread, Signal
+)
+
+try:
+    import orjson
+    _loads = orjson.loads
+
+    def _dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, indent=2).encode()
+
+
+def _digest(data):
+    """Short content hash used to detect unchanged rule files"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+# Debounce field contents: a whole number of milliseconds
+_DEBOUNCE_RE = re.compile(r"\s*(\d+)\s*")
 
 
 class RuleDialog(QDialog):
@@ -21,30 +48,57 @@ class RuleDialog(QDialog):
     
     # Define event types and their properties
     EVENT_PROPERTIES = {
-        "openwindow": ["address", "workspace", "class", "title"],
-        "closewindow": ["address", "workspace", "class", "title"],
-        "activewindow": ["class", "title"],
-        "activewindowv2": ["address"],
-        "workspace": ["name"],
-        "workspacev2": ["name", "id"],
-        "destroyworkspacev2": ["name", "id"],
-        "windowtitle": ["address"],
-        "windowtitlev2": ["address", "title"],
-        "activelayout": ["keyboard", "layout"],
-        "urgent": ["address"]
+        "openwindow": ("address", "workspace", "class", "title"),
+        "closewindow": ("address", "workspace", "class", "title"),
+        "activewindow": ("class", "title"),
+        "activewindowv2": ("address",),
+        "workspace": ("name",),
+        "workspacev2": ("name", "id"),
+        "destroyworkspacev2": ("name", "id"),
+        "windowtitle": ("address",),
+        "windowtitlev2": ("address", "title"),
+        "activelayout": ("keyboard", "layout"),
+        "urgent": ("address",)
     }
     
+    # Event types offered as triggers; the daemon has no property mapping
+    # for urgent, so it is not listed
+    TRIGGER_TYPES = tuple(k for k in EVENT_PROPERTIES if k != "urgent")
+    
+    OPERATORS = ("equals", "contains", "startswith", "endswith", "greater", "less")
+    
+    # List models shared by every dialog, created with the first one
+    _trigger_model = None
+    _operator_model = None
+    _property_models = None
+    _empty_model = None
+    
+    @classmethod
+    def _init_shared_models(cls):
+        """Create the shared list models once"""
+        if cls._operator_model is not None:
+            return
+        cls._trigger_model = QStringListModel(list(cls.TRIGGER_TYPES))
+        cls._operator_model = QStringListModel(list(cls.OPERATORS))
+        cls._property_models = {
+            event_type: QStringListModel(list(properties))
+            for event_type, properties in cls.EVENT_PROPERTIES.items()
+        }
+        cls._empty_model = QStringListModel()
+    
     def __init__(self, rule_data=None, parent=None):
         super().__init__(parent)
         self.rule_data = rule_data or {}
-        self.conditions_widgets = []
-        self.actions_widgets = []
+        # Row entries keyed by their row widget, in display order
+        self.conditions_widgets = {}
+        self.actions_widgets = {}
         self.setup_ui()
         if self.rule_data:
             self.populate_data()
     
     def setup_ui(self):
         """Setup the dialog UI"""
+        self._init_shared_models()
         self.setWindowTitle("Edit Rule" if self.rule_data else "New Rule")
         self.resize(500, 600)
         
@@ -62,11 +116,7 @@ class RuleDialog(QDialog):
         
         # Trigger type
         self.trigger_combo = QComboBox()
-        self.trigger_combo.addItems([
-            "openwindow", "closewindow", "activewindow", "activewindowv2",
-            "workspace", "workspacev2", "destroyworkspacev2", 
-            "windowtitle", "windowtitlev2", "activelayout"
-        ])
+        self.trigger_combo.setModel(self._trigger_model)
         self.trigger_combo.currentTextChanged.connect(self.on_trigger_changed)
         layout.addWidget(QLabel("Trigger Type:"))
         layout.addWidget(self.trigger_combo)
@@ -74,11 +124,14 @@ class RuleDialog(QDialog):
         # Trigger debounce
         self.debounce_edit = QLineEdit()
         self.debounce_edit.setPlaceholderText("Debounce (ms) - e.g. 200")
+        self.debounce_edit.setValidator(QIntValidator(0, 10_000_000, self.debounce_edit))
         layout.addWidget(QLabel("Debounce (optional):"))
         layout.addWidget(self.debounce_edit)
         
         # Conditions section
         layout.addWidget(QLabel("Conditions:"))
+        # Hidden condition rows kept for reuse instead of being deleted
+        self._row_pool = []
         self.conditions_layout = QVBoxLayout()
         conditions_widget = QWidget()
         conditions_widget.setLayout(self.conditions_layout)
@@ -111,24 +164,27 @@ class RuleDialog(QDialog):
     
     def on_trigger_changed(self, event_type):
         """Handle trigger type change to update condition property options"""
-        # This could be extended to dynamically update property options in existing conditions
-        pass
+        model = self._property_models.get(event_type, self._empty_model)
+        for cw in self.conditions_widgets.values():
+            property_combo = cw['property']
+            current = property_combo.currentText()
+            property_combo.setModel(model)
+            property_index = property_combo.findText(current)
+            if property_index >= 0:
+                property_combo.setCurrentIndex(property_index)
     
-    def add_condition(self, condition_data=None):
-        """Add a condition row"""
+    def _create_condition_row(self):
+        """Build the widgets for a condition row"""
         widget = QWidget()
         layout = QHBoxLayout(widget)
         
         # Property
         property_combo = QComboBox()
-        current_event = self.trigger_combo.currentText()
-        properties = self.EVENT_PROPERTIES.get(current_event, [])
-        property_combo.addItems(properties)
         layout.addWidget(property_combo)
         
         # Operator
         operator_combo = QComboBox()
-        operator_combo.addItems(["equals", "contains", "startswith", "endswith", "greater", "less"])
+        operator_combo.setModel(self._operator_model)
         layout.addWidget(operator_combo)
         
         # Value
@@ -138,16 +194,36 @@ class RuleDialog(QDialog):
         
         # Remove button
         remove_btn = QPushButton("Remove")
-        remove_btn.clicked.connect(lambda: self.remove_condition(widget))
+        remove_btn.clicked.connect(partial(self.remove_condition, widget))
         layout.addWidget(remove_btn)
         
-        self.conditions_layout.addWidget(widget)
-        self.conditions_widgets.append({
+        return {
             'widget': widget,
             'property': property_combo,
             'operator': operator_combo,
             'value': value_edit
-        })
+        }
+    
+    def add_condition(self, condition_data=None):
+        """Add a condition row, reusing a previously removed one if possible"""
+        if self._row_pool:
+            row = self._row_pool.pop()
+            row['operator'].setCurrentIndex(0)
+            row['value'].clear()
+        else:
+            row = self._create_condition_row()
+        
+        property_combo = row['property']
+        operator_combo = row['operator']
+        value_edit = row['value']
+        
+        current_event = self.trigger_combo.currentText()
+        property_combo.setModel(self._property_models.get(current_event, self._empty_model))
+        property_combo.setCurrentIndex(0)
+        
+        self.conditions_layout.addWidget(row['widget'])
+        row['widget'].show()
+        self.conditions_widgets[row['widget']] = row
         
         # Populate if editing existing condition
         if condition_data:
@@ -161,11 +237,14 @@ class RuleDialog(QDialog):
                 
             value_edit.setText(condition_data.get('value', ''))
     
-    def remove_condition(self, widget):
-        """Remove a condition row"""
+    def remove_condition(self, widget, _checked=False):
+        """Remove a condition row and keep it hidden for reuse"""
+        row = self.conditions_widgets.pop(widget, None)
+        if row is None:
+            return
         self.conditions_layout.removeWidget(widget)
-        widget.deleteLater()
-        self.conditions_widgets = [cw for cw in self.conditions_widgets if cw['widget'] != widget]
+        widget.hide()
+        self._row_pool.append(row)
     
     def add_action(self, action_data=None):
         """Add an action row"""
@@ -179,24 +258,26 @@ class RuleDialog(QDialog):
         
         # Remove button
         remove_btn = QPushButton("Remove")
-        remove_btn.clicked.connect(lambda: self.remove_action(widget))
+        remove_btn.clicked.connect(partial(self.remove_action, widget))
         layout.addWidget(remove_btn)
         
         self.actions_layout.addWidget(widget)
-        self.actions_widgets.append({
+        self.actions_widgets[widget] = {
             'widget': widget,
             'command': command_edit
-        })
+        }
         
         # Populate if editing existing action
         if action_data:
             command_edit.setText(action_data.get('command', ''))
     
-    def remove_action(self, widget):
+    def remove_action(self, widget, _checked=False):
         """Remove an action row"""
+        if self.actions_widgets.pop(widget, None) is None:
+            return
         self.actions_layout.removeWidget(widget)
+        widget.setParent(None)
         widget.deleteLater()
-        self.actions_widgets = [aw for aw in self.actions_widgets if aw['widget'] != widget]
     
     def populate_data(self):
         """Populate dialog with existing rule data"""
@@ -213,20 +294,28 @@ class RuleDialog(QDialog):
         if debounce:
             self.debounce_edit.setText(str(debounce))
         
-        # Populate conditions
-        conditions = self.rule_data.get('conditions', [])
-        for condition in conditions:
-            self.add_condition(condition)
-        
-        # Populate actions
-        actions = self.rule_data.get('actions', [])
-        for action in actions:
-            self.add_action(action)
+        # Add all rows with updates and signals off so the dialog is laid
+        # out once at the end instead of once per row
+        self.setUpdatesEnabled(False)
+        self.blockSignals(True)
+        try:
+            # Populate conditions
+            conditions = self.rule_data.get('conditions', [])
+            for condition in conditions:
+                self.add_condition(condition)
+            
+            # Populate actions
+            actions = self.rule_data.get('actions', [])
+            for action in actions:
+                self.add_action(action)
+        finally:
+            self.blockSignals(False)
+            self.setUpdatesEnabled(True)
     
     def get_rule_data(self):
         """Get rule data from dialog inputs"""
         conditions = []
-        for cw in self.conditions_widgets:
+        for cw in self.conditions_widgets.values():
             prop = cw['property'].currentText()
             operator = cw['operator'].currentText()
             value = cw['value'].text()
@@ -238,7 +327,7 @@ class RuleDialog(QDialog):
                 })
         
         actions = []
-        for aw in self.actions_widgets:
+        for aw in self.actions_widgets.values():
             command = aw['command'].text()
             if command:
                 actions.append({
@@ -249,15 +338,15 @@ class RuleDialog(QDialog):
             'type': self.trigger_combo.currentText()
         }
         
-        try:
-            debounce = int(self.debounce_edit.text())
+        # Ignore empty or invalid debounce values
+        match = _DEBOUNCE_RE.fullmatch(self.debounce_edit.text())
+        if match:
+            debounce = int(match.group(1))
             if debounce > 0:
                 trigger_data['debounce'] = debounce
-        except ValueError:
-            pass  # Ignore invalid debounce value
         
         return {
-            'id': self.rule_data.get('id', os.urandom(4).hex()),
+            'id': self.rule_data.get('id') or secrets.token_hex(4),
             'name': self.name_edit.text(),
             'enabled': self.enabled_check.isChecked(),
             'trigger': trigger_data,
@@ -266,6 +355,89 @@ class RuleDialog(QDialog):
         }
 
 
+class RulesModel(QAbstractListModel):
+    """List model exposing rules by name with an enabled checkbox"""
+    
+    def __init__(self, rules, parent=None):
+        super().__init__(parent)
+        self.rules = rules
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rules)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        rule = self.rules[index.row()]
+        if role == Qt.DisplayRole:
+            return rule.get('name', 'Unnamed Rule')
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if rule.get('enabled', True) else Qt.Unchecked
+        if role == Qt.UserRole:
+            return rule
+        return None
+    
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsUserCheckable
+    
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.CheckStateRole:
+            return False
+        self.rules[index.row()]['enabled'] = Qt.CheckState(value) == Qt.Checked
+        self.dataChanged.emit(index, index, [role])
+        return True
+    
+    def set_rules(self, rules):
+        """Replace all rules"""
+        self.beginResetModel()
+        self.rules = rules
+        self.endResetModel()
+    
+    def insert_rule(self, row, rule):
+        """Insert a rule at the given row"""
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rules.insert(row, rule)
+        self.endInsertRows()
+    
+    def update_rule(self, row, rule):
+        """Replace the rule at the given row"""
+        self.rules[row] = rule
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+    
+    def remove_rule(self, row):
+        """Remove the rule at the given row"""
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rules[row]
+        self.endRemoveRows()
+
+
+class RulesLoader(QThread):
+    """Reads and parses the rules file off the GUI thread"""
+    
+    # Parsed rules and the digest of the raw file contents
+    loaded = Signal(object, bytes)
+    failed = Signal(str)
+    
+    def __init__(self, config_path, parent=None):
+        super().__init__(parent)
+        self.config_path = config_path
+    
+    def run(self):
+        try:
+            if self.config_path.exists():
+                raw = self.config_path.read_bytes()
+                rules = _loads(raw)
+                digest = _digest(raw)
+            else:
+                rules = []
+                digest = b''
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.loaded.emit(rules, digest)
+
+
 class HyperFlowEditor(QMainWindow):
     """Main editor window"""
     
@@ -273,6 +445,11 @@ class HyperFlowEditor(QMainWindow):
         super().__init__()
         self.config_path = Path.home() / ".config/hyperflow/workflows.json"
         self.rules = []
+        # Ids of rules added, edited or deleted since the last load/save
+        self._dirty = set()
+        self._loader = None
+        # Digest of the config file contents as last loaded or saved
+        self._last_saved_hash = b''
         self.setup_ui()
         self.load_rules()
     
@@ -286,8 +463,11 @@ class HyperFlowEditor(QMainWindow):
         layout = QVBoxLayout(central_widget)
         
         # Rules list
-        self.rules_list = QListWidget()
-        self.rules_list.itemDoubleClicked.connect(self.edit_rule_on_double_click)  # 添加双击事件连接
+        self.rules_model = RulesModel(self.rules, self)
+        self.rules_model.dataChanged.connect(self._on_rules_data_changed)
+        self.rules_list = QListView()
+        self.rules_list.setModel(self.rules_model)
+        self.rules_list.doubleClicked.connect(self.edit_rule_on_double_click)  # 添加双击事件连接
         layout.addWidget(QLabel("Automation Rules:"))
         layout.addWidget(self.rules_list)
         
@@ -313,49 +493,68 @@ class HyperFlowEditor(QMainWindow):
         layout.addLayout(buttons_layout)
     
     def load_rules(self):
-        """Load rules from config file"""
-        try:
-            if self.config_path.exists():
-                with open(self.config_path, 'r') as f:
-                    self.rules = json.load(f)
-                self.refresh_rules_list()
-            else:
-                self.rules = []
-                self.refresh_rules_list()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to load rules: {e}")
-            self.rules = []
-            self.refresh_rules_list()
+        """Load rules from config file on a worker thread"""
+        self.centralWidget().setEnabled(False)
+        self.statusBar().showMessage("Loading rules...")
+        self._loader = RulesLoader(self.config_path, self)
+        self._loader.loaded.connect(self._on_rules_loaded)
+        self._loader.failed.connect(self._on_rules_load_failed)
+        self._loader.start()
+    
+    def _on_rules_loaded(self, rules, digest):
+        """Show rules parsed by the loader thread"""
+        self.rules = rules
+        self._last_saved_hash = digest
+        self._dirty.clear()
+        self.refresh_rules_list()
+        self.statusBar().clearMessage()
+        self.centralWidget().setEnabled(True)
+    
+    def _on_rules_load_failed(self, error):
+        """Report a failed load and start with an empty rule set"""
+        self.statusBar().clearMessage()
+        self.centralWidget().setEnabled(True)
+        QMessageBox.critical(self, "Error", f"Failed to load rules: {error}")
+        self.rules = []
+        self.refresh_rules_list()
+    
+    def closeEvent(self, event):
+        """Wait for a pending load so the thread is not destroyed while running"""
+        if self._loader is not None:
+            self._loader.wait()
+        super().closeEvent(event)
     
     def refresh_rules_list(self):
         """Refresh the rules list display"""
-        self.rules_list.clear()
-        for rule in self.rules:
-            item = QListWidgetItem(rule.get('name', 'Unnamed Rule'))
-            item.setCheckState(Qt.Checked if rule.get('enabled', True) else Qt.Unchecked)
-            item.setData(Qt.UserRole, rule)
-            self.rules_list.addItem(item)
+        self.rules_model.set_rules(self.rules)
+    
+    def _on_rules_data_changed(self, top_left, bottom_right, roles=()):
+        """Mark rules toggled or edited through the model as changed"""
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            self._dirty.add(self.rules[row].get('id'))
+    
+    def current_row(self):
+        """Return the selected row, or -1 if nothing is selected"""
+        return self.rules_list.currentIndex().row()
     
     def new_rule(self):
         """Create a new rule"""
         dialog = RuleDialog(parent=self)
         if dialog.exec() == QDialog.Accepted:
             rule_data = dialog.get_rule_data()
-            self.rules.append(rule_data)
-            self.refresh_rules_list()
+            self._dirty.add(rule_data['id'])
+            self.rules_model.insert_rule(len(self.rules), rule_data)
     
-    def edit_rule_on_double_click(self, item):
+    def edit_rule_on_double_click(self, index):
         """Edit rule when double clicked"""
-        # 获取项目在列表中的行号
-        row = self.rules_list.row(item)
         # 设置为当前选中行
-        self.rules_list.setCurrentRow(row)
+        self.rules_list.setCurrentIndex(index)
         # 调用编辑规则函数
         self.edit_selected_rule()
     
     def edit_rule(self):
         """Edit selected rule"""
-        current_row = self.rules_list.currentRow()
+        current_row = self.current_row()
         if current_row < 0:
             QMessageBox.warning(self, "Warning", "Please select a rule to edit.")
             return
@@ -364,22 +563,21 @@ class HyperFlowEditor(QMainWindow):
     
     def edit_selected_rule(self):
         """Edit currently selected rule"""
-        current_row = self.rules_list.currentRow()
+        current_row = self.current_row()
         if current_row < 0:
             return
             
-        item = self.rules_list.item(current_row)
-        rule_data = item.data(Qt.UserRole)
+        rule_data = self.rules[current_row]
         
         dialog = RuleDialog(rule_data, parent=self)
         if dialog.exec() == QDialog.Accepted:
             new_rule_data = dialog.get_rule_data()
-            self.rules[current_row] = new_rule_data
-            self.refresh_rules_list()
+            self._dirty.add(new_rule_data['id'])
+            self.rules_model.update_rule(current_row, new_rule_data)
     
     def delete_rule(self):
         """Delete selected rule"""
-        current_row = self.rules_list.currentRow()
+        current_row = self.current_row()
         if current_row < 0:
             QMessageBox.warning(self, "Warning", "Please select a rule to delete.")
             return
@@ -387,18 +585,30 @@ class HyperFlowEditor(QMainWindow):
         reply = QMessageBox.question(self, "Confirm", "Are you sure you want to delete this rule?",
                                      QMessageBox.Yes | QMessageBox.No)
         if reply == QMessageBox.Yes:
-            del self.rules[current_row]
-            self.refresh_rules_list()
+            self._dirty.add(self.rules[current_row].get('id'))
+            self.rules_model.remove_rule(current_row)
     
     def save_rules(self):
         """Save rules to config file"""
+        if not self._dirty and self.config_path.exists():
+            QMessageBox.information(self, "Success", f"No changes to save in {self.config_path}")
+            return
+        
         try:
             # Create directory if it doesn't exist
             self.config_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # Save rules
-            with open(self.config_path, 'w') as f:
-                json.dump(self.rules, f, indent=2)
+            # Skip the write if the file already has exactly this content
+            payload = _dumps(self.rules)
+            digest = _digest(payload)
+            if digest != self._last_saved_hash:
+                # Write to a temporary file and swap it in so an interrupted
+                # save never leaves a truncated config behind
+                tmp_path = self.config_path.with_name(self.config_path.name + '.tmp')
+                tmp_path.write_bytes(payload)
+                os.replace(tmp_path, self.config_path)
+                self._last_saved_hash = digest
+            self._dirty.clear()
             
             QMessageBox.information(self, "Success", f"Rules saved to {self.config_path}")
         except Exception as e:
@@ -5,7 +5,6 @@ Main entry point
 """
 
 import sys
-import os
 from pathlib import Path
 
 # Add the hyperflow module to the path
@@ -19,7 +18,7 @@ Usage:
   python main.py [command]
 
 Commands:
-  daemon    Run the HyperFlow daemon
+  daemon    Run the HyperFlow daemon (add --verbose to log every event)
   editor    Launch the HyperFlow GUI editor
   cli       Use the command-line interface
   
@@ -43,12 +42,13 @@ def main():
     
     if command == "daemon":
         # Run the daemon
-        from hyperflow.daemon import HyperFlowDaemon
+        from hyperflow.daemon import HyperFlowDaemon, setup_logging
+        setup_logging('--verbose' in sys.argv[2:])
         daemon = HyperFlowDaemon()
         daemon.run()
         
     elif command == "editor":
-        # Launch the GUI editor
+        # Launch the GUI editor; PySide6 is only imported on this path
         from hyperflow.editor import main as editor_main
         editor_main()
         